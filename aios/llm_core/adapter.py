@@ -1,17 +1,24 @@
 from aios.context.simple_context import SimpleContextManager
-from aios.llm_core.strategy import RouterStrategy, SimpleStrategy
-from aios.llm_core.local import HfLocalBackend, VLLMLocalBackend, OllamaBackend
-from aios.utils.id_generator import generator_tool_call_id
+from aios.llm_core.strategy import RouterStrategy, SimpleStrategy, estimate_cost
+from aios.llm_core.local import HfLocalBackend, VLLMLocalBackend
 from cerebrum.llm.apis import LLMQuery, LLMResponse
-from litellm import completion
+import litellm
+import httpx
+import diskcache
+import hashlib
+import asyncio
+import threading
+import itertools
+import functools
 import json
-from .utils import tool_calling_input_format, parse_json_format, parse_tool_calls, pre_process_tools
-from typing import Dict, Optional, Any, List, Union
+from .utils import tool_calling_input_format, parse_json_format, parse_tool_calls, JsonStreamScanner
+from typing import Dict, Optional, Any, List, Union, Callable
 import time
 import re
 import os
 from aios.config.config_manager import config
 from dataclasses import dataclass
+from collections import defaultdict
 import logging
 
 # Configure logging
@@ -20,6 +27,83 @@ logger = logging.getLogger(__name__)
 
 from openai import OpenAI
 
+_API_KEY_RE = re.compile(r"(API key provided:\s*)([^\s.]+)")
+
+def _mask_api_key(match: re.Match) -> str:
+    api_key = match.group(2)
+    masked_key = f"{api_key[:2]}****{api_key[-2:]}" if len(api_key) > 4 else "****"
+    return match.group(1) + masked_key
+
+_SHUTDOWN_MESSAGE = "LLMAdapter has been shut down"
+
+_API_PROVIDERS = {
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "huggingface": "HF_AUTH_TOKEN"
+}
+
+# config dict the environment was last populated from; config.refresh()
+# loads a new dict, so refreshed keys are picked up by the next adapter
+_bootstrapped_config = None
+_bootstrap_lock = threading.Lock()
+
+def _bootstrap_api_keys() -> None:
+    """
+    Set up API keys for different providers from config or environment.
+    
+    The method checks for API keys in the following order:
+    1. Config file
+    2. Environment variables
+    
+    The environment is process-wide, so this only runs once per loaded
+    config no matter how many adapters are created.
+    """
+    global _bootstrapped_config
+    
+    with _bootstrap_lock:
+        if _bootstrapped_config is config.config:
+            return
+        
+        logger.debug("=== LLMAdapter API key setup ===")
+        
+        for provider, env_var in _API_PROVIDERS.items():
+            logger.debug(f"Checking {provider} API key")
+            api_key = config.get_api_key(provider)
+            if api_key:
+                logger.debug("- Found in config.yaml, setting to environment")
+                os.environ[env_var] = api_key
+                if provider == "huggingface":
+                    os.environ["HUGGING_FACE_API_KEY"] = api_key
+                    logger.debug("- Also set HUGGING_FACE_API_KEY")
+        
+        _bootstrapped_config = config.config
+
+# Keep-alive HTTP/2 pool shared by every adapter in the process, see
+# _shared_http_client
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+def _shared_http_client() -> httpx.Client:
+    """
+    Return the process-wide sync connection pool, creating it on first use.
+
+    litellm's client_session is a process-wide setting, so the pool behind it
+    is created once and outlives any single adapter instead of being replaced
+    (and closed) per adapter. A sync client is not tied to an event loop, so
+    every adapter and its OpenAI-compatible clients can share it. Async
+    litellm calls use the clients litellm pools per event loop itself.
+    """
+    global _http_client
+    
+    with _http_client_lock:
+        if _http_client is None:
+            limits = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+            _http_client = httpx.Client(http2=True, limits=limits, timeout=60)
+            litellm.client_session = _http_client
+        return _http_client
+
 @dataclass
 class LLMConfig:
     """
@@ -102,40 +186,148 @@ class LLMAdapter:
         self.llm_configs = llm_configs
         self.llms = []
         
-        self._setup_api_keys()
+        _bootstrap_api_keys()
+        self._http_client = _shared_http_client()
         self._initialize_llms()
+        self._build_call_table()
+        
+        litellm.drop_params = True
+        
+        self._setup_cache()
+        
+        # Every syscall runs on this one long-lived event loop so that the
+        # async clients litellm pools per loop keep their connections alive
+        # between requests.
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="LLMAdapterLoop",
+            daemon=True
+        )
+        self._loop_thread.start()
+        
+        llms_config = config.get_llms_config()
+        self._workers_per_backend = llms_config.get("workers_per_backend", 16)
+        self._backend_queue_size = llms_config.get("backend_queue_size", 64)
+        self._max_batch_size = llms_config.get("local_batch_size", 8)
+        self._batch_window = llms_config.get("local_batch_window", 0.005)
+        self._aging_rate = llms_config.get("queue_aging_rate", 1000)
+        self._batch_buffers: Dict[tuple, List] = {}
+        self._queues: Dict[int, asyncio.PriorityQueue] = {}
+        # tie-breaker so requests with equal keys keep arrival order
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result()
         
         if strategy == RouterStrategy.SIMPLE:
             self.strategy = SimpleStrategy(self.llm_configs)
+        
+        # per-replica load, used to spread requests across configs that
+        # serve the same model. Only touched from the adapter loop, so plain
+        # ints need no lock.
+        self._rr_counters: Dict[int, itertools.count] = defaultdict(itertools.count)
+        self._inflight: List[int] = [0] * len(self.llm_configs)
+        
+        self._dispatch = self._compile_dispatch()
 
-    def _setup_api_keys(self) -> None:
+    def cleanup(self) -> None:
         """
-        Set up API keys for different providers from config or environment.
+        Fail pending requests, stop the backend workers and stop the
+        adapter's event loop. The process-wide connection pool stays open
+        for other adapters and later litellm calls.
+
+        Syscalls issued afterwards get an error response instead of waiting
+        on the stopped loop.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+
+    async def _shutdown(self) -> None:
+        """Fail every queued or batched request, then cancel the workers."""
+        error = RuntimeError(_SHUTDOWN_MESSAGE)
+        for queue in self._queues.values():
+            while not queue.empty():
+                *_, future = queue.get_nowait()
+                queue.task_done()
+                if not future.done():
+                    future.set_exception(error)
         
-        The method checks for API keys in the following order:
-        1. Config file
-        2. Environment variables
+        for batch in self._batch_buffers.values():
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        self._batch_buffers.clear()
         
+        # workers fail the request they are running when cancelled
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def _closed_response(self) -> LLMResponse:
+        return LLMResponse(
+            response_message=f"System Error: {_SHUTDOWN_MESSAGE}",
+            error=_SHUTDOWN_MESSAGE,
+            finished=True,
+            status_code=500
+        )
+
+    def _setup_cache(self) -> None:
         """
-        api_providers = {
-            "openai": "OPENAI_API_KEY",
-            "gemini": "GEMINI_API_KEY",
-            "groq": "GROQ_API_KEY",
-            "anthropic": "ANTHROPIC_API_KEY",
-            "huggingface": "HF_AUTH_TOKEN"
-        }
+        Set up response caching for deterministic (temperature=0) calls.
+
+        litellm models use litellm's disk cache. OpenAI-compatible servers
+        (vllm/sglang) share a diskcache store under the same directory, keyed
+        on model and messages. Local backends are never cached: they do not
+        decode greedily at temperature 0 (HfLocalBackend samples with a
+        temperature of at least 0.5, VLLMLocalBackend ignores the requested
+        temperature), so a cached reply would freeze one random sample.
+        """
+        llms_config = config.get_llms_config()
+        cache_dir = llms_config.get("llm_cache_dir", ".litellm_cache")
+        self._cache_ttl = llms_config.get("llm_cache_ttl")
         
-        logger.info("=== LLMAdapter Initialization ===")
+        # opt-in only, so litellm calls made elsewhere (context saving,
+        # local backends' online inference) are never cached
+        litellm.cache = litellm.Cache(
+            type="disk",
+            mode="default_off",
+            disk_cache_dir=cache_dir,
+            ttl=self._cache_ttl
+        )
+        self._local_cache = diskcache.Cache(os.path.join(cache_dir, "local"))
+
+    async def _call_cached(self, model_idx: int, call: Any, messages: List[Dict], temperature: float) -> Any:
+        """
+        Run a backend call through the local response cache when temperature is 0.
+
+        Args:
+            model_idx: Index of the backend, its name is part of the cache key
+            call: Callable returning an awaitable that produces the response
+            messages: Prepared messages, part of the cache key
+            temperature: Temperature parameter, other values bypass the cache
+
+        Returns:
+            The cached or freshly computed response
+        """
+        if temperature != 0:
+            return await call(messages=messages, temperature=temperature)
         
-        for provider, env_var in api_providers.items():
-            logger.info(f"\nChecking {provider} API key:")
-            api_key = config.get_api_key(provider)
-            if api_key:
-                logger.info(f"- Found in config.yaml, setting to environment")
-                os.environ[env_var] = api_key
-                if provider == "huggingface":
-                    os.environ["HUGGING_FACE_API_KEY"] = api_key
-                    logger.info("- Also set HUGGING_FACE_API_KEY")
+        key = hashlib.sha256(
+            json.dumps({"model": self._model_names[model_idx], "messages": messages}, sort_keys=True).encode()
+        ).hexdigest()
+        
+        res = await asyncio.to_thread(self._local_cache.get, key)
+        if res is None:
+            res = await call(messages=messages, temperature=temperature)
+            await asyncio.to_thread(self._local_cache.set, key, res, expire=self._cache_ttl)
+        return res
 
     def _initialize_llms(self) -> None:
         """Initialize LLM backends based on configurations."""
@@ -210,13 +402,15 @@ class LLMAdapter:
             case "vllm":
                 self.llms.append(OpenAI(
                     base_url=config.hostname,
-                    api_key="sk-1234"
+                    api_key="sk-1234",
+                    http_client=self._http_client
                 ))
             
             case "sglang":
                 self.llms.append(OpenAI(
                     base_url=config.hostname,
-                    api_key="sk-1234"
+                    api_key="sk-1234",
+                    http_client=self._http_client
                 ))
                 
             case _:
@@ -257,15 +451,7 @@ class LLMAdapter:
         error_msg = str(error)
         
         # Mask API key in error message
-        if "API key provided:" in error_msg:
-            key_start = error_msg.find("API key provided:") + len("API key provided: ")
-            key_end = error_msg.find(".", key_start)
-            if key_end == -1:
-                key_end = error_msg.find(" ", key_start)
-            if key_end != -1:
-                api_key = error_msg[key_start:key_end]
-                masked_key = f"{api_key[:2]}****{api_key[-2:]}" if len(api_key) > 4 else "****"
-                error_msg = error_msg[:key_start] + masked_key + error_msg[key_end:]
+        error_msg = _API_KEY_RE.sub(_mask_api_key, error_msg)
 
         if "Invalid API key" in error_msg or "API key not found" in error_msg:
             return LLMResponse(
@@ -290,6 +476,9 @@ class LLMAdapter:
         """
         Address request sent from the agent.
 
+        Blocking wrapper around `aexecute_llm_syscall` for the scheduler
+        threads. The coroutine is run on the adapter's event loop.
+
         Args:
             llm_syscall: LLMSyscall object containing the request
             temperature: Parameter to control output randomness
@@ -318,59 +507,106 @@ class LLMAdapter:
             }
             ```
         """
-        try:
-            messages = llm_syscall.query.messages
-            tools = llm_syscall.query.tools
-            ret_type = llm_syscall.query.message_return_type
-            selected_llms = llm_syscall.query.llms if llm_syscall.query.llms else self.llm_configs
+        if self._closed:
+            return self._closed_response()
+        
+        return asyncio.run_coroutine_threadsafe(
+            self.aexecute_llm_syscall(llm_syscall, temperature),
+            self._loop
+        ).result()
 
-            llm_syscall.set_status("executing")
-            llm_syscall.set_start_time(time.time())
-            
-            # breakpoint()
-            
-            model_idxs = self.strategy.get_model_idxs(selected_llms)
-            model_idx = model_idxs[0]
-            model = self.llms[model_idx]
-            
-            model_name = self.llm_configs[model_idx].get("name")
-            
-            api_base = self.llm_configs[model_idx].get("hostname", None)
-            
-            breakpoint()
-            
-            # if tools:
-            #     tools = pre_process_tools(tools)
-            
-            messages = self._prepare_messages(
-                llm_syscall=llm_syscall,
-                model=model,
-                messages=messages,
-                tools=tools
-            )
-            
-            breakpoint()
+    def execute_llm_syscalls(
+        self,
+        llm_syscalls: List[Any],
+        temperature: float = 0.0
+    ) -> List[LLMResponse]:
+        """
+        Address a batch of requests concurrently and block until all finish.
+
+        Args:
+            llm_syscalls: List of LLMSyscall objects
+            temperature: Parameter to control output randomness
+
+        Returns:
+            List of LLMResponse in the same order as `llm_syscalls`
+        """
+        if self._closed:
+            return [self._closed_response() for _ in llm_syscalls]
+        
+        return asyncio.run_coroutine_threadsafe(
+            self.aexecute_llm_syscalls(llm_syscalls, temperature),
+            self._loop
+        ).result()
+
+    async def aexecute_llm_syscalls(
+        self,
+        llm_syscalls: List[Any],
+        temperature: float = 0.0
+    ) -> List[LLMResponse]:
+        """
+        Address a batch of requests concurrently.
+
+        The network round trips of all requests overlap, so the batch takes
+        roughly as long as its slowest request.
+
+        Args:
+            llm_syscalls: List of LLMSyscall objects
+            temperature: Parameter to control output randomness
+
+        Returns:
+            List of LLMResponse in the same order as `llm_syscalls`
+        """
+        return await asyncio.gather(*[
+            self.aexecute_llm_syscall(llm_syscall, temperature)
+            for llm_syscall in llm_syscalls
+        ])
+
+    async def aexecute_llm_syscall(
+        self,
+        llm_syscall,
+        temperature: float = 0.0
+    ) -> LLMResponse:
+        """
+        Address request sent from the agent without blocking the event loop.
+
+        The request is routed to a replica and put on that backend's queue,
+        where one of its workers picks it up. Waits while the queue is full.
+        Pending requests are served cheapest first (see `estimate_cost`),
+        with aging so long ones are not starved: the queue key is the
+        enqueue time plus cost / `queue_aging_rate`, which orders requests
+        the same as their cost minus `queue_aging_rate` per second waited.
+        A request is therefore never passed over by one that arrives more
+        than cost / `queue_aging_rate` seconds after it.
+        Must run on the adapter's loop; other threads and loops go through
+        `execute_llm_syscall` / `execute_llm_syscalls`.
+
+        Args:
+            llm_syscall: LLMSyscall object containing the request
+            temperature: Parameter to control output randomness
+
+        Returns:
+            LLMResponse containing the model's response or error information
+        """
+        if self._closed:
+            return self._closed_response()
+        
+        try:
+            model_idx = self._dispatch(llm_syscall)
             
             try:
-                completed_response, finished = self._get_model_response(
-                    model_name=model_name,
-                    model=model, 
-                    messages=messages, 
-                    tools=tools,
-                    temperature=temperature, 
-                    llm_syscall=llm_syscall,
-                    api_base=api_base
+                future = self._loop.create_future()
+                cost = estimate_cost(llm_syscall.query.messages, llm_syscall.query.tools)
+                deadline = time.monotonic() + cost / self._aging_rate
+                await self._queues[model_idx].put(
+                    (deadline, next(self._seq), llm_syscall, temperature, future)
                 )
-                
-            except Exception as e:
-                return self._handle_completion_error(e)
-
-            return self._process_response(
-                completed_response=completed_response, 
-                finished=finished,
-                tools=tools, 
-                ret_type=ret_type
-            )
+                if self._closed:
+                    # shut down while waiting for queue space; no worker
+                    # will pick this request up
+                    return self._closed_response()
+                return await future
+            finally:
+                self._release_replica(model_idx)
 
         except Exception as e:
             return LLMResponse(
@@ -380,6 +616,143 @@ class LLMAdapter:
                 status_code=500
             )
 
+    async def _start_workers(self) -> None:
+        """Create a bounded priority queue and a pool of workers for every backend."""
+        for model_idx in range(len(self.llms)):
+            self._queues[model_idx] = asyncio.PriorityQueue(maxsize=self._backend_queue_size)
+            for _ in range(self._workers_per_backend):
+                self._workers.append(asyncio.create_task(self._worker(model_idx)))
+
+    async def _worker(self, model_idx: int) -> None:
+        """
+        Drain the queue of one backend, resolving each request's future.
+
+        Args:
+            model_idx: Index of the backend this worker serves
+        """
+        queue = self._queues[model_idx]
+        while True:
+            _, _, llm_syscall, temperature, future = await queue.get()
+            try:
+                response = await self._run_one(model_idx, llm_syscall, temperature)
+                if not future.done():
+                    future.set_result(response)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(RuntimeError(_SHUTDOWN_MESSAGE))
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _run_one(
+        self,
+        model_idx: int,
+        llm_syscall,
+        temperature: float
+    ) -> LLMResponse:
+        """
+        Run a single request against the backend at model_idx.
+
+        Args:
+            model_idx: Index of the backend to use
+            llm_syscall: LLMSyscall object containing the request
+            temperature: Parameter to control output randomness
+
+        Returns:
+            LLMResponse containing the model's response or error information
+        """
+        messages = llm_syscall.query.messages
+        tools = llm_syscall.query.tools
+        ret_type = llm_syscall.query.message_return_type
+
+        llm_syscall.set_status("executing")
+        llm_syscall.set_start_time(time.time())
+        
+        messages = self._prepare_messages(
+            llm_syscall=llm_syscall,
+            model=self.llms[model_idx],
+            messages=messages,
+            tools=tools
+        )
+        
+        try:
+            completed_response, finished = await self._get_model_response(
+                model_idx=model_idx,
+                messages=messages, 
+                tools=tools,
+                temperature=temperature, 
+                llm_syscall=llm_syscall
+            )
+            
+        except Exception as e:
+            return self._handle_completion_error(e)
+
+        return self._process_response(
+            completed_response=completed_response, 
+            finished=finished,
+            tools=tools, 
+            ret_type=ret_type
+        )
+
+    def _compile_dispatch(self) -> Callable:
+        """
+        Choose, once, how requests are routed to a backend.
+
+        Strategy lookups and replica bookkeeping only matter when there is a
+        choice to make, so an adapter with a single backend skips them.
+
+        Returns:
+            Callable mapping an LLMSyscall to the index of its backend
+        """
+        if len(self.llm_configs) == 1:
+            return self._route_single_backend
+        return self._route
+
+    def _route(self, llm_syscall) -> int:
+        """Route through the strategy, then pick the least loaded replica."""
+        selected_llms = llm_syscall.query.llms if llm_syscall.query.llms else self.llm_configs
+        
+        model_idxs = self.strategy.get_model_idxs(selected_llms)
+        return self._pick_replica(model_idxs[0])
+
+    def _route_single_backend(self, llm_syscall) -> int:
+        """Route when only one backend is configured."""
+        if llm_syscall.query.llms:
+            # explicit selections still go through the strategy so that
+            # unknown models are rejected as before
+            return self._route(llm_syscall)
+        
+        self._inflight[0] += 1
+        return 0
+
+    def _pick_replica(self, model_idx: int) -> int:
+        """
+        Pick the replica of the model at model_idx with the fewest requests
+        in flight and count the new request against it.
+
+        Ties are broken round-robin so idle replicas share sequential traffic.
+
+        Args:
+            model_idx: Index of any config serving the requested model
+
+        Returns:
+            Index of the chosen replica in self.llms
+        """
+        replicas = self.strategy.get_replica_idxs(model_idx)
+        start = next(self._rr_counters[replicas[0]]) % len(replicas)
+        rotated = replicas[start:] + replicas[:start]
+        
+        replica_idx = min(rotated, key=self._inflight.__getitem__)
+        self._inflight[replica_idx] += 1
+        return replica_idx
+
+    def _release_replica(self, replica_idx: int) -> None:
+        """Mark a request on replica_idx as finished."""
+        self._inflight[replica_idx] -= 1
+
     def _prepare_messages(self, llm_syscall, model, messages: List[Dict], tools: Optional[List] = None) -> List[Dict]:
         """
         Prepare messages for the LLM, including context restoration and tool formatting.
@@ -417,34 +790,32 @@ class LLMAdapter:
                 model=model,
                 # tokenizer=tokenizer # TODO: Add tokenizer
             )
-            messages += [{
+            messages = messages + [{
                 "role": "assistant",
                 "content": "" + restored_context,
             }]
             
         # if not isinstance(model, str):
         if tools:
-            tools = pre_process_tools(tools)
             messages = tool_calling_input_format(messages, tools)
 
         return messages
 
-    def _get_model_response(
+    async def _get_model_response(
         self, 
-        model_name: str,
-        model: Union[str, HfLocalBackend, VLLMLocalBackend, OllamaBackend, OpenAI],
+        model_idx: int,
         messages: List[Dict],
         tools: Optional[List],
         temperature: float,
-        llm_syscall,
-        api_base: Optional[str] = None
+        llm_syscall
     ) -> Any:
         """
         Get response from the model.
 
         Args:
-            model: The LLM model to use
+            model_idx: Index of the backend to use
             messages: Prepared messages
+            tools: Optional list of tools
             temperature: Temperature parameter
             llm_syscall: The syscall object
 
@@ -454,7 +825,7 @@ class LLMAdapter:
         Example:
             ```python
             # Input
-            model = "openai/gpt-4o-mini"
+            model_idx = 0  # "openai/gpt-4o-mini"
             messages = [{"role": "user", "content": "Hello!"}]
             temperature = 1.0
             
@@ -471,58 +842,194 @@ class LLMAdapter:
             }
             ```
         """
-        if isinstance(model, str):
-            if self.use_context_manager:
-                pid = llm_syscall.get_pid()
-                time_limit = llm_syscall.get_time_limit()
-                completed_response, finished = self.context_manager.save_context(
-                    model=model, 
-                    messages=messages, 
-                    # tools=tools,
-                    temperature=temperature, 
-                    pid=pid,
-                    time_limit=time_limit
-                )
-                
-                return completed_response, finished
-                
-            else:
-                # breakpoint()
-                completed_response = completion(
-                    model=model, 
-                    messages=messages, 
-                    # tools=tools, 
-                    temperature=temperature, 
-                    api_base=api_base
-                )
-                # if tools:
-                #     breakpoint()
-                
-                return completed_response.choices[0].message.content, True
-            
-        elif isinstance(model, OpenAI):
-            if self.use_context_manager:
-                completed_response, finished = self.context_manager.save_context(
-                    model=model, 
-                    messages=messages, 
-                    # tools=tools,
-                    temperature=temperature, 
-                    pid=pid,
-                    time_limit=time_limit
-                )
-                return completed_response, finished
+        model = self.llms[model_idx]
+        
+        if self.use_context_manager and isinstance(model, (str, OpenAI)):
+            completed_response, finished = await asyncio.to_thread(
+                self.context_manager.save_context,
+                model_name=self._model_names[model_idx],
+                model=model, 
+                messages=messages, 
+                tools=tools,
+                temperature=temperature, 
+                pid=llm_syscall.get_pid(),
+                time_limit=llm_syscall.get_time_limit()
+            )
+            return completed_response, finished
+
+        call_fn = self._tool_call_fn if tools else self._call_fn
+        completed_response = await call_fn[model_idx](model_idx, messages, temperature)
+        return completed_response, True
+
+    def _build_call_table(self) -> None:
+        """
+        Resolve once, per backend, which coroutine serves its requests so the
+        request path indexes a list instead of checking backend types.
+        """
+        self._model_names = [llm_config.get("name") for llm_config in self.llm_configs]
+        self._api_bases = [llm_config.get("hostname") for llm_config in self.llm_configs]
+        
+        self._call_fn: List[Callable] = []
+        for model in self.llms:
+            if isinstance(model, str):
+                self._call_fn.append(self._call_litellm)
+            elif isinstance(model, OpenAI):
+                self._call_fn.append(self._call_openai)
+            elif isinstance(model, (HfLocalBackend, VLLMLocalBackend)) and model.hostname is None:
+                self._call_fn.append(self._call_batched)
             else:
-                # breakpoint()
-                # response = model.chat.completions.create(model=model_name, messages=messages, tools=tools, temperature=temperature)
-                completed_response = model.chat.completions.create(
-                    model=model_name,
-                    messages=messages,
-                    # tools=tools, 
-                    temperature=temperature
-                )
-                
-                # breakpoint()
-                return completed_response.choices[0].message.content, True
+                self._call_fn.append(self._call_local)
+        
+        # requests with tools may stream from litellm and stop at the first
+        # complete tool call list, see llms.stream_tool_calls
+        stream_tool_calls = config.get_llms_config().get("stream_tool_calls", False)
+        self._tool_call_fn: List[Callable] = [
+            self._stream_litellm_tool_call if stream_tool_calls and call_fn == self._call_litellm else call_fn
+            for call_fn in self._call_fn
+        ]
+
+    async def _call_litellm(self, model_idx: int, messages: List[Dict], temperature: float) -> str:
+        """Call a litellm model; litellm caches temperature=0 responses itself."""
+        completed_response = await litellm.acompletion(
+            model=self.llms[model_idx], 
+            messages=messages, 
+            # tools=tools, 
+            temperature=temperature, 
+            api_base=self._api_bases[model_idx],
+            caching=temperature == 0,
+            cache={"use-cache": temperature == 0}
+        )
+        return completed_response.choices[0].message.content
+
+    async def _stream_litellm_tool_call(self, model_idx: int, messages: List[Dict], temperature: float) -> str:
+        """
+        Stream a litellm completion and stop reading as soon as the first
+        complete JSON array/object has arrived, dropping any commentary the
+        model would generate after its tool calls.
+
+        Returns:
+            The JSON text, or the whole response if it never contained any
+        """
+        response = await litellm.acompletion(
+            model=self.llms[model_idx], 
+            messages=messages, 
+            temperature=temperature, 
+            api_base=self._api_bases[model_idx],
+            stream=True,
+            caching=False
+        )
+        
+        scanner = JsonStreamScanner()
+        try:
+            async for part in response:
+                span = scanner.feed(part.choices[0].delta.content or "")
+                if span is not None:
+                    return span
+        finally:
+            aclose = getattr(response, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        
+        return scanner.text
+
+    async def _call_openai(self, model_idx: int, messages: List[Dict], temperature: float) -> str:
+        """Call an OpenAI-compatible server (vllm/sglang) from a worker thread."""
+        model = self.llms[model_idx]
+        model_name = self._model_names[model_idx]
+        
+        def create(messages, temperature):
+            return model.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                # tools=tools, 
+                temperature=temperature
+            ).choices[0].message.content
+        
+        return await self._call_cached(
+            model_idx,
+            functools.partial(asyncio.to_thread, create),
+            messages,
+            temperature
+        )
+
+    async def _call_batched(self, model_idx: int, messages: List[Dict], temperature: float) -> str:
+        """Call an in-process model through the micro-batcher, uncached (see _setup_cache)."""
+        return await self._batched_call(model_idx, messages, temperature)
+
+    async def _call_local(self, model_idx: int, messages: List[Dict], temperature: float) -> str:
+        """Call a local backend's blocking __call__ from a worker thread, uncached (see _setup_cache)."""
+        return await asyncio.to_thread(self.llms[model_idx], messages, temperature)
+
+    async def _batched_call(
+        self,
+        model_idx: int,
+        messages: List[Dict],
+        temperature: float
+    ) -> str:
+        """
+        Coalesce requests to an in-process model into one batched generation.
+
+        Requests for the same model and temperature arriving within the batch
+        window are generated together; a full batch is flushed right away. A
+        request with nothing else queued or in flight on its backend, as with
+        a caller that issues one syscall at a time, is flushed right away too
+        instead of waiting out the window.
+
+        Args:
+            model_idx: Index of a local backend that implements `batch_inference`
+            messages: Prepared messages of this request
+            temperature: Temperature parameter, batches never mix temperatures
+
+        Returns:
+            The model's reply to `messages`
+        """
+        key = (self.llms[model_idx], temperature)
+        future = self._loop.create_future()
+        
+        batch = self._batch_buffers.setdefault(key, [])
+        batch.append((messages, future))
+        # _inflight counts this request and every other one routed to the
+        # backend but not finished, whether queued, buffered or running
+        if len(batch) >= self._max_batch_size or self._inflight[model_idx] <= 1:
+            del self._batch_buffers[key]
+            asyncio.create_task(self._flush_batch(key, batch))
+        elif len(batch) == 1:
+            asyncio.create_task(self._flush_batch(key, batch, delay=self._batch_window))
+        
+        return await future
+
+    async def _flush_batch(self, key: tuple, batch: List, delay: float = 0) -> None:
+        """
+        Run one pending batch and resolve the futures of its requests.
+
+        Args:
+            key: (model, temperature) the batch was collected under
+            batch: The buffer to flush
+            delay: Seconds to wait for more requests before flushing; the
+                flush is skipped if the buffer filled up in the meantime
+        """
+        if delay:
+            await asyncio.sleep(delay)
+            if self._batch_buffers.get(key) is not batch:
+                return
+            del self._batch_buffers[key]
+        
+        model, temperature = key
+        try:
+            responses = await asyncio.to_thread(
+                model.batch_inference,
+                [messages for messages, _ in batch],
+                temperature
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
 
     def _process_response(
         self, 
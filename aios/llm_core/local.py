@@ -62,21 +62,57 @@ class HfLocalBackend:
                                                        return_dict=True,
                                                        return_tensors="pt")
         inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
-        temperature = temperature if temperature > 0.5 else 0.5
-        response  = self.model.generate(**inputs,
-                                        temperature=temperature,
-                                        max_length=4096,
-                                        top_k=10,
-                                        num_beams=4,
-                                        early_stopping=True,
-                                        do_sample=True,
-                                        num_return_sequences=1,
-                                        eos_token_id=self.tokenizer.eos_token_id)
+        response  = self.model.generate(**inputs, **self._generate_kwargs(temperature))
         length    = inputs["input_ids"].shape[1]
         result    = self.tokenizer.decode(response[0][length:])
 
         return result
 
+    def _generate_kwargs(self, temperature):
+        """Sampling settings shared by __call__ and batch_inference."""
+        return dict(temperature=temperature if temperature > 0.5 else 0.5,
+                    max_length=4096,
+                    top_k=10,
+                    num_beams=4,
+                    early_stopping=True,
+                    do_sample=True,
+                    num_return_sequences=1,
+                    eos_token_id=self.tokenizer.eos_token_id)
+
+    def batch_inference(self, messages_batch, temperature):
+        """Generate replies for several conversations in one forward pass."""
+        if self.hostname is not None:
+            return [self.inference_online(messages, temperature) for messages in messages_batch]
+
+        # decoder-only models need left padding so every prompt ends where
+        # generation starts
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        inputs = self.tokenizer.apply_chat_template(messages_batch,
+                                                       tokenize=True,
+                                                       add_generation_prompt=True,
+                                                       padding=True,
+                                                       return_dict=True,
+                                                       return_tensors="pt")
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        response  = self.model.generate(**inputs,
+                                        **self._generate_kwargs(temperature),
+                                        pad_token_id=self.tokenizer.pad_token_id)
+        length    = inputs["input_ids"].shape[1]
+
+        results = []
+        for output in response:
+            output = output[length:]
+            # sequences that finish early are padded up to the longest one;
+            # cut after the first eos so the text matches what __call__ decodes
+            eos_positions = (output == self.tokenizer.eos_token_id).nonzero()
+            if len(eos_positions) > 0:
+                output = output[:eos_positions[0].item() + 1]
+            results.append(self.tokenizer.decode(output))
+        return results
+
 class VLLMLocalBackend:
     def __init__(self, model_name, device="auto", max_gpu_memory=None, hostname=None):
         print("\n=== VLLMLocalBackend Initialization ===")
@@ -141,6 +177,20 @@ class VLLMLocalBackend:
 
         return result
 
+    def batch_inference(self, messages_batch, temperature):
+        """Generate replies for several conversations in one vLLM call."""
+        if self.hostname is not None:
+            return [self.inference_online(messages, temperature) for messages in messages_batch]
+
+        assert self.model
+        assert self.sampling_params
+
+        prompts    = [self.tokenizer.apply_chat_template(messages, tokenize=False)
+                      for messages in messages_batch]
+        responses  = self.model.generate(prompts, self.sampling_params)
+
+        return [response.outputs[0].text for response in responses]
+
 class OllamaBackend:
     def __init__(self, model_name, device="auto", max_gpu_memory=None, hostname=None):
         print("\n=== OllamaBackend Initialization ===")
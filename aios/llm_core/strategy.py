@@ -21,6 +21,12 @@ class SimpleStrategy:
     def __init__(self, llm_configs: List[Dict[str, Any]]):
         self.llm_configs = llm_configs
         self.idx = 0
+        
+        # name -> positions in llm_configs, built once so lookups don't rescan
+        # the configs on every query. Configs sharing a name are replicas.
+        self.name_to_idxs = {}
+        for i, llm_config in enumerate(self.llm_configs):
+            self.name_to_idxs.setdefault(llm_config["name"], []).append(i)
 
     # def __call__(self):
     #     return self.get_model()
@@ -31,11 +37,24 @@ class SimpleStrategy:
         
         for _ in range(n_queries):
             current = selected_llms[self.idx]
-            for i, llm_config in enumerate(self.llm_configs):
-                # breakpoint()
-                if llm_config["name"] == current["name"]:
-                    model_idxs.append(i)
-                    break
+            if current["name"] in self.name_to_idxs:
+                model_idxs.append(self.name_to_idxs[current["name"]][0])
             self.idx = (self.idx + 1) % len(selected_llms)
         
         return model_idxs
+
+    def get_replica_idxs(self, model_idx: int) -> List[int]:
+        """Return the indexes of every config serving the same model as model_idx."""
+        return self.name_to_idxs[self.llm_configs[model_idx]["name"]]
+
+def estimate_cost(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> int:
+    """
+    Rough cost of a request, used to order pending requests on a backend so
+    short ones are not stuck behind long ones (aged by waiting time, see
+    LLMAdapter.aexecute_llm_syscall). Prompt length stands in for work; tool
+    calls add the size of the injected tool instruction.
+    """
+    cost = sum(len(message.get("content") or "") for message in messages)
+    if tools:
+        cost += 200
+    return cost
@@ -1,69 +1,218 @@
-import json
+import os
 import re
 import uuid
+from typing import Any, Iterator, List, Optional
+
+import orjson
+
+_JSON_TOKEN_RE = re.compile(r'[\[\]{}"\\]')
+_JSON_OPENERS = {"]": "[", "}": "{"}
+
+_TOOL_PREFIX = (
+    "In and only in current step, you need to call tools. Available tools are: "
+)
+_TOOL_SUFFIX = (
+    "Must call functions that are available. To call a function, respond "
+    "immediately and only with a list of JSON object of the following format:"
+    '[{"name":"function_name_value","parameters":{"parameter_name1":"parameter_value1",'
+    '"parameter_name2":"parameter_value2"}}]'
+)
 
 def tool_calling_input_format(messages: list, tools: list) -> list:
     """Integrate tool information into the messages for open-sourced LLMs
 
+    Tool names containing "/" are rewritten to use "__" in the same pass,
+    parse_tool_calls maps them back. Neither argument is modified, so a
+    retried request gets the same prompt again.
+
     Args:
         messages (list): messages with different roles
         tools (list): tool information
+
+    Returns:
+        list: new list of messages ending in a user turn carrying the tool-calling instruction
     """
-    prefix_prompt = (
-        "In and only in current step, you need to call tools. Available tools are: "
-    )
-    tool_prompt = json.dumps(tools)
-    suffix_prompt = "".join(
-        [
-            "Must call functions that are available. To call a function, respond "
-            "immediately and only with a list of JSON object of the following format:"
-            '[{"name":"function_name_value","parameters":{"parameter_name1":"parameter_value1",'
-            '"parameter_name2":"parameter_value2"}}]'
-        ]
-    )
+    sanitized_tools = []
+    for tool in tools:
+        function = tool["function"]
+        if "/" in function["name"]:
+            function = {**function, "name": function["name"].replace("/", "__")}
+            tool = {**tool, "function": function}
+        sanitized_tools.append(tool)
+    tool_prompt = orjson.dumps(sanitized_tools).decode()
 
     # translate tool call message for models don't support tool call
+    formatted_messages = []
     for message in messages:
         if "tool_calls" in message:
-            message["content"] = json.dumps(message.pop("tool_calls"))
+            tool_calls = message["tool_calls"]
+            message = {key: value for key, value in message.items() if key != "tool_calls"}
+            message["content"] = orjson.dumps(tool_calls).decode()
             
         elif message["role"] == "tool":
+            tool_call_id = message["tool_call_id"]
+            content = message["content"]
+            message = {key: value for key, value in message.items() if key != "tool_call_id"}
             message["role"] = "user"
-            tool_call_id = message.pop("tool_call_id")
-            content = message.pop("content")
             message["content"] = (
                 f"The result of the execution of function(id :{tool_call_id}) is: {content}. "
             )
+        formatted_messages.append(message)
 
-    messages[-1]["content"] += prefix_prompt + tool_prompt + suffix_prompt
-    return messages
+    # The instruction must reach the model as a user turn without creating two
+    # consecutive turns of one role, which strict-alternation chat templates
+    # (Mistral, Llama-2) reject: merge it into a trailing user message,
+    # otherwise (e.g. after a restored assistant context) add a user turn.
+    last_message = formatted_messages[-1]
+    if last_message["role"] == "user":
+        formatted_messages[-1] = {
+            **last_message,
+            "content": "".join((last_message["content"] or "", _TOOL_PREFIX, tool_prompt, _TOOL_SUFFIX))
+        }
+    else:
+        formatted_messages.append({
+            "role": "user",
+            "content": f"{_TOOL_PREFIX}{tool_prompt}{_TOOL_SUFFIX}"
+        })
+    return formatted_messages
 
-def parse_json_format(message: str) -> str:
-    json_array_pattern = r"\[\s*\{.*?\}\s*\]"
-    json_object_pattern = r"\{\s*.*?\s*\}"
+class JsonStreamScanner:
+    """Find the first complete JSON array/object in text that arrives in chunks.
 
-    match_array = re.search(json_array_pattern, message)
+    Every character is read once, however the text is split. A stack holds
+    the unclosed brackets and each bracket that closes marks a candidate
+    span. Candidates are checked once the outermost bracket around them
+    closes, in order of start position, so an enclosing span is preferred to
+    the spans nested in it. Brackets inside string literals are ignored, and
+    so are quotes and closing brackets in prose outside any bracket.
+    """
 
-    if match_array:
-        json_array_substring = match_array.group(0)
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[tuple] = []
+        self._open_counts = {"[": 0, "{": 0}
+        self._in_string = False
+        self._escaped_pos = -1
+        self._spans: List[tuple] = []
 
-        try:
-            json_array_data = json.loads(json_array_substring)
-            return json.dumps(json_array_data)
-        except json.JSONDecodeError:
-            pass
+    def feed(self, chunk: str) -> Optional[str]:
+        """Append chunk; return the first span that parses to an object or a
+        list of objects (see _is_json_payload), once it is complete."""
+        self.text += chunk
+        for spans in self._scan():
+            found = _first_payload(self.text, spans)
+            if found is not None:
+                return found[0]
+        return None
+
+    def _scan(self) -> Iterator[List[tuple]]:
+        """Read the unread text, yielding the (start, end) spans inside each
+        outermost bracket as it closes, sorted by start."""
+        for token in _JSON_TOKEN_RE.finditer(self.text, self._pos):
+            pos = token.start()
+            if pos == self._escaped_pos:
+                continue
+            char = token.group()
+            if self._in_string:
+                if char == "\\":
+                    self._escaped_pos = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char in "[{":
+                self._stack.append((char, pos))
+                self._open_counts[char] += 1
+            elif not self._stack or char == "\\":
+                continue
+            elif char == '"':
+                self._in_string = True
+            else:
+                opener = _JSON_OPENERS[char]
+                if not self._open_counts[opener]:
+                    continue
+                # brackets left open inside this pair can no longer close
+                while True:
+                    popped, start = self._stack.pop()
+                    self._open_counts[popped] -= 1
+                    if popped == opener:
+                        break
+                self._spans.append((start, pos + 1))
+                if not self._stack:
+                    self._pos = pos + 1
+                    spans = sorted(self._spans)
+                    self._spans = []
+                    yield spans
+        self._pos = len(self.text)
+
+def _is_json_payload(data: Any) -> bool:
+    """Whether parsed JSON is an object or a non-empty list of objects.
 
-    match_object = re.search(json_object_pattern, message)
+    Anything else (citations like [1], lists of scalars) is prose that
+    happens to parse, and scanning continues past it.
+    """
+    if isinstance(data, dict):
+        return True
+    return isinstance(data, list) and bool(data) and all(isinstance(item, dict) for item in data)
+
+def _json_containers(data: Any) -> List[Any]:
+    """Arrays and objects in parsed JSON, data first, in document order."""
+    containers = []
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        containers.append(value)
+        children = value.values() if isinstance(value, dict) else value
+        stack.extend(reversed([child for child in children if isinstance(child, (dict, list))]))
+    return containers
+
+def _first_payload(text: str, spans: List[tuple]) -> Optional[tuple]:
+    """Return (span text, parsed value) of the first tool-call payload among
+    spans, which are sorted by start, or None.
 
-    if match_object:
-        json_object_substring = match_object.group(0)
+    The spans nested in one that parses are exactly its nested arrays and
+    objects in the same order, so when it is not a payload they are checked
+    on the parsed value instead of being parsed again.
+    """
+    i = 0
+    while i < len(spans):
+        start, end = spans[i]
+        try:
+            data = orjson.loads(text[start:end])
+        except orjson.JSONDecodeError:
+            i += 1
+            continue
+        
+        containers = _json_containers(data)
+        for offset, value in enumerate(containers):
+            if _is_json_payload(value):
+                start, end = spans[i + offset]
+                return text[start:end], value
+        i += len(containers)
+    return None
 
+def _load_json(message: str) -> Any:
+    # fast path: the whole response is the JSON, as native tool callers return
+    stripped = message.strip()
+    if stripped[:1] in ("[", "{"):
         try:
-            json_object_data = json.loads(json_object_substring)
-            return json.dumps(json_object_data)
-        except json.JSONDecodeError:
+            data = orjson.loads(stripped)
+            if _is_json_payload(data):
+                return data
+        except orjson.JSONDecodeError:
             pass
-    return "[]"
+
+    scanner = JsonStreamScanner()
+    scanner.text = message
+    for spans in scanner._scan():
+        found = _first_payload(message, spans)
+        if found is not None:
+            return found[1]
+    # spans nested in a bracket that never closes
+    found = _first_payload(message, sorted(scanner._spans))
+    return found[1] if found is not None else []
+
+def parse_json_format(message: str) -> str:
+    return orjson.dumps(_load_json(message)).decode()
 
 def generator_tool_call_id():
     return str(uuid.uuid4())
@@ -72,25 +221,20 @@ def parse_tool_calls(message):
     # add tool call id and type for models don't support tool call
     # if isinstance(message, dict):
     #     message = [message]
-    tool_calls = json.loads(parse_json_format(message))
+    tool_calls = _load_json(message)
     # breakpoint()
     # tool_calls = json.loads(message)
     if isinstance(tool_calls, dict):
         tool_calls = [tool_calls]
+
+    # one urandom read for every id instead of a uuid4() call per tool call
+    random_bytes = os.urandom(16 * len(tool_calls))
         
-    for tool_call in tool_calls:
-        tool_call["id"] = generator_tool_call_id()
+    for i, tool_call in enumerate(tool_calls):
+        tool_call["id"] = str(uuid.UUID(bytes=random_bytes[16 * i:16 * (i + 1)], version=4))
         # if "function" in tool_call:
         
         # else:
         tool_call["name"] = tool_call["name"].replace("__", "/")
         # tool_call["type"] = "function"
     return tool_calls
-
-def pre_process_tools(tools):
-    for tool in tools:
-        tool_name = tool["function"]["name"]
-        if "/" in tool_name:
-            tool_name = "__".join(tool_name.split("/"))
-            tool["function"]["name"] = tool_name
-    return tools
\ No newline at end of file
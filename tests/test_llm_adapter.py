@@ -0,0 +1,142 @@
+"""
+Function: Check the request plumbing of `aios.llm_core.adapter.LLMAdapter`:
+API key masking in error responses, replica selection and release, and
+micro-batching of in-process models. No LLM backend is contacted.
+"""
+import asyncio
+import itertools
+import threading
+import types
+from collections import defaultdict
+
+from aios.llm_core.adapter import LLMAdapter, _API_KEY_RE, _mask_api_key
+from aios.llm_core.strategy import SimpleStrategy
+
+def _bare_adapter(llm_configs, llms=None):
+    # only the state the tested methods use, no backends or event loop thread
+    adapter = LLMAdapter.__new__(LLMAdapter)
+    adapter.llm_configs = llm_configs
+    adapter.llms = llms if llms is not None else [config["name"] for config in llm_configs]
+    adapter.strategy = SimpleStrategy(llm_configs)
+    adapter._rr_counters = defaultdict(itertools.count)
+    adapter._inflight = [0] * len(llm_configs)
+    adapter._batch_buffers = {}
+    adapter._max_batch_size = 8
+    adapter._batch_window = 0.05
+    adapter._closed = False
+    adapter._aging_rate = 1000
+    adapter._seq = itertools.count()
+    adapter._dispatch = adapter._route
+    return adapter
+
+def _syscall(content="hi"):
+    query = types.SimpleNamespace(messages=[{"role": "user", "content": content}], tools=None, llms=None)
+    return types.SimpleNamespace(query=query)
+
+def _mask(message):
+    return _API_KEY_RE.sub(_mask_api_key, message)
+
+def test_mask_api_key_at_end_of_message():
+    assert _mask("Invalid API key provided: sk-abcdef123456") == "Invalid API key provided: sk****56"
+
+def test_mask_api_key_followed_by_period():
+    assert _mask("Invalid API key provided: sk-abcdef123456. Check it.") == (
+        "Invalid API key provided: sk****56. Check it."
+    )
+
+def test_mask_short_api_key():
+    assert _mask("Invalid API key provided: abc.") == "Invalid API key provided: ****."
+
+def test_completion_error_hides_api_key():
+    adapter = _bare_adapter([{"name": "m"}])
+    response = adapter._handle_completion_error(ValueError("Invalid API key provided: sk-abcdef123456"))
+    assert response.status_code == 402
+    assert "sk-abcdef123456" not in response.error
+
+def test_pick_replica_least_in_flight():
+    adapter = _bare_adapter([{"name": "m"}, {"name": "m"}, {"name": "m"}])
+    adapter._inflight = [2, 0, 1]
+    assert adapter._pick_replica(0) == 1
+    assert adapter._inflight == [2, 1, 1]
+
+def test_pick_replica_round_robin_on_ties():
+    adapter = _bare_adapter([{"name": "m"}, {"name": "other"}, {"name": "m"}])
+    picked = []
+    for _ in range(4):
+        replica_idx = adapter._pick_replica(0)
+        picked.append(replica_idx)
+        adapter._release_replica(replica_idx)
+    assert picked == [0, 2, 0, 2]
+    assert adapter._inflight == [0, 0, 0]
+
+def test_replica_released_when_request_fails():
+    async def run():
+        adapter = _bare_adapter([{"name": "m"}, {"name": "m"}])
+        adapter._loop = asyncio.get_running_loop()
+        adapter._queues = {0: asyncio.PriorityQueue(), 1: asyncio.PriorityQueue()}
+
+        task = asyncio.create_task(adapter.aexecute_llm_syscall(_syscall()))
+        await asyncio.sleep(0)
+        assert sum(adapter._inflight) == 1
+
+        queue = next(queue for queue in adapter._queues.values() if queue.qsize())
+        *_, future = queue.get_nowait()
+        future.set_exception(RuntimeError("backend down"))
+        return adapter, await task
+
+    adapter, response = asyncio.run(run())
+    assert response.status_code == 500
+    assert adapter._inflight == [0, 0]
+
+class _BatchModel:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self.lock = threading.Lock()
+
+    def batch_inference(self, messages_batch, temperature):
+        with self.lock:
+            self.batches.append(len(messages_batch))
+        if self.error:
+            raise self.error
+        return [messages[-1]["content"].upper() for messages in messages_batch]
+
+def _run_batched(model, contents, inflight, **settings):
+    async def run():
+        adapter = _bare_adapter([{"name": "m"}], llms=[model])
+        adapter._loop = asyncio.get_running_loop()
+        adapter._inflight = [inflight]
+        for name, value in settings.items():
+            setattr(adapter, name, value)
+        calls = [
+            adapter._batched_call(0, [{"role": "user", "content": content}], 0.7)
+            for content in contents
+        ]
+        # a missed flush would wait for the window, which is far longer
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 5)
+    return asyncio.run(run())
+
+def test_full_batch_flushes_immediately():
+    model = _BatchModel()
+    replies = _run_batched(model, ["a", "b"], inflight=2, _max_batch_size=2, _batch_window=60)
+    assert replies == ["A", "B"]
+    assert model.batches == [2]
+
+def test_window_batch_flushes_once():
+    model = _BatchModel()
+    replies = _run_batched(model, ["a", "b", "c"], inflight=3, _max_batch_size=8, _batch_window=0.05)
+    assert replies == ["A", "B", "C"]
+    assert model.batches == [3]
+
+def test_lone_request_skips_window():
+    model = _BatchModel()
+    replies = _run_batched(model, ["a"], inflight=1, _batch_window=60)
+    assert replies == ["A"]
+    assert model.batches == [1]
+
+def test_batch_error_fails_every_request():
+    error = RuntimeError("CUDA out of memory")
+    model = _BatchModel(error=error)
+    replies = _run_batched(model, ["a", "b", "c"], inflight=3)
+    assert replies == [error, error, error]
+    assert model.batches == [3]
@@ -0,0 +1,140 @@
+"""
+Function: Check the tool-calling prompt and JSON extraction from raw LLM
+replies in `aios.llm_core.utils`, which tool calling and
+`message_return_type="json"` rely on.
+"""
+import json
+import time
+
+from aios.llm_core.utils import (
+    parse_json_format, parse_tool_calls, JsonStreamScanner, tool_calling_input_format
+)
+
+def test_parse_json_format_skips_leading_citation():
+    message = 'See [1] then [{"name":"a","parameters":{}}]'
+    assert json.loads(parse_json_format(message)) == [{"name": "a", "parameters": {}}]
+
+def test_parse_json_format_skips_scalar_arrays():
+    assert parse_json_format("[1, 2]") == "[]"
+    assert parse_json_format("As shown in [2] and [3].") == "[]"
+
+def test_parse_json_format_nested_braces():
+    message = 'Result: {"a": {"b": [{"c": 1}]}} done'
+    assert json.loads(parse_json_format(message)) == {"a": {"b": [{"c": 1}]}}
+
+def test_parse_json_format_brackets_inside_strings():
+    message = 'Here: {"text": "close ] and } early [1]"} end'
+    assert json.loads(parse_json_format(message)) == {"text": "close ] and } early [1]"}
+
+def test_parse_json_format_escaped_quotes():
+    message = 'Out: {"q": "say \\"hi\\" }"} trailing'
+    assert json.loads(parse_json_format(message)) == {"q": 'say "hi" }'}
+
+def test_parse_json_format_skips_invalid_span():
+    message = 'text {bad} then {"k": "v"}'
+    assert json.loads(parse_json_format(message)) == {"k": "v"}
+
+def test_parse_json_format_multiline():
+    message = '[\n  {"a": 1},\n  {"b": 2}\n]'
+    assert json.loads(parse_json_format(message)) == [{"a": 1}, {"b": 2}]
+
+def test_parse_json_format_no_json():
+    assert parse_json_format("no json here") == "[]"
+
+def test_parse_json_format_object_nested_in_scalar_list():
+    assert json.loads(parse_json_format('[1, {"a": 1}]')) == {"a": 1}
+
+def test_parse_json_format_inside_unclosed_bracket():
+    message = 'note { see [{"a": "x"}] and \\ ] stray'
+    assert json.loads(parse_json_format(message)) == [{"a": "x"}]
+
+def test_parse_json_format_unbalanced_input_is_linear():
+    start = time.perf_counter()
+    assert parse_json_format("{" * 100000) == "[]"
+    assert parse_json_format("[" * 2000 + "1" + "]" * 2000) == "[]"
+    assert parse_json_format("[" * 50000 + "}" * 50000) == "[]"
+    # the old rescan-from-every-opener scanner needed minutes here
+    assert time.perf_counter() - start < 5
+
+def test_parse_tool_calls_after_step_citation():
+    tool_calls = parse_tool_calls('Step [1]: [{"name":"a__b","parameters":{}}]')
+    assert len(tool_calls) == 1
+    assert tool_calls[0]["name"] == "a/b"
+    assert tool_calls[0]["parameters"] == {}
+    assert tool_calls[0]["id"]
+
+def test_parse_tool_calls_single_object():
+    tool_calls = parse_tool_calls('{"name": "calc", "parameters": {"x": "[2]"}}')
+    assert [tool_call["name"] for tool_call in tool_calls] == ["calc"]
+    assert tool_calls[0]["parameters"] == {"x": "[2]"}
+
+def test_parse_tool_calls_unique_ids():
+    tool_calls = parse_tool_calls('[{"name": "a"}, {"name": "b"}, {"name": "c"}]')
+    assert len({tool_call["id"] for tool_call in tool_calls}) == 3
+
+def test_parse_tool_calls_without_json():
+    assert parse_tool_calls("I could not find a tool [1].") == []
+
+def _feed_chunks(chunks):
+    scanner = JsonStreamScanner()
+    for i, chunk in enumerate(chunks):
+        span = scanner.feed(chunk)
+        if span is not None:
+            return i, span
+    return None, None
+
+def test_stream_scanner_skips_step_citation():
+    i, span = _feed_chunks(['Step [1', ']: [{"name":"a",', '"parameters":{}}]'])
+    assert i == 2
+    assert json.loads(span) == [{"name": "a", "parameters": {}}]
+
+def test_stream_scanner_split_inside_string_and_escape():
+    payload = json.dumps([{"name": "a", "parameters": {"q": 'x] \\" }{'}}])
+    text = "Call [2]: " + payload + " and some commentary"
+    end = text.index(payload) + len(payload)
+    # every cut position, including inside the string and between the
+    # backslash and the character it escapes
+    for cut in range(1, end):
+        i, span = _feed_chunks([text[:cut], text[cut:end], text[end:]])
+        assert span == payload
+        assert i == 1
+
+def test_stream_scanner_matches_batch_parser():
+    text = 'See [1] and {"a": [1, 2]} then [{"name": "b"}]'
+    scanner = JsonStreamScanner()
+    spans = [scanner.feed(char) for char in text]
+    span = next(span for span in spans if span is not None)
+    assert json.loads(span) == json.loads(parse_json_format(text))
+
+_TOOLS = [{"type": "function", "function": {"name": "demo/calc", "parameters": {}}}]
+
+def test_tool_instruction_merged_into_last_user_turn():
+    messages = [
+        {"role": "system", "content": "sys"},
+        {"role": "user", "content": "add 1 and 2"},
+    ]
+    formatted = tool_calling_input_format(messages, _TOOLS)
+    assert [message["role"] for message in formatted] == ["system", "user"]
+    assert formatted[-1]["content"].startswith("add 1 and 2")
+    assert "demo__calc" in formatted[-1]["content"]
+    assert messages[-1]["content"] == "add 1 and 2"
+
+def test_tool_instruction_after_assistant_is_user_turn():
+    messages = [
+        {"role": "user", "content": "add 1 and 2"},
+        {"role": "assistant", "content": "restored context"},
+    ]
+    formatted = tool_calling_input_format(messages, _TOOLS)
+    assert [message["role"] for message in formatted] == ["user", "assistant", "user"]
+    assert formatted[1] == messages[1]
+    assert "demo__calc" in formatted[-1]["content"]
+
+def test_tool_instruction_after_tool_result_is_merged():
+    messages = [
+        {"role": "user", "content": "add 1 and 2"},
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "x", "name": "demo/calc"}]},
+        {"role": "tool", "tool_call_id": "x", "content": "3"},
+    ]
+    formatted = tool_calling_input_format(messages, _TOOLS)
+    assert [message["role"] for message in formatted] == ["user", "assistant", "user"]
+    assert "demo__calc" in formatted[-1]["content"]